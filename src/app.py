@@ -5,12 +5,24 @@ from typing import Dict, List, Optional, Tuple
 import io
 import base64
 from datetime import datetime
+import functools
+import gc
 import json
+import orjson
 import yaml
 import os
 
 current_year = datetime.now().year
 
+# Loader C de libyaml (5-10x más rápido); si PyYAML se instaló sin libyaml
+# se usa el loader puro-Python como fallback
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# Valores por defecto compartidos para dict.get: evitan asignar un dict/list
+# vacío nuevo en cada llamada (seguros porque nunca se mutan)
+_EMPTY = ()
+_EMPTY_D = {}
+
 # Configuración de página
 st.set_page_config(
     page_title="AESVAL - Modelos de tasa de descuento",
@@ -46,8 +58,13 @@ st.set_page_config(
 # """
 # st.markdown(hide_streamlit_style, unsafe_allow_html=True)
 
+@st.cache_resource(ttl=24*60*60, show_spinner=False)
 def cargar_configuracion_sistema():
-    """Carga la configuración del sistema desde archivo YAML"""
+    """Carga la configuración del sistema desde archivo YAML.
+
+    Cacheada con st.cache_resource: la configuración es global y de solo
+    lectura, así que se comparte entre sesiones (un único parseo por proceso
+    en lugar de uno por pestaña del navegador) y los reruns evitan el I/O"""
     posibles_rutas = [
         '/app/config/info.yaml',  # Ruta en contenedor Docker
         '/app/config/info.yml',   # Alternativa con .yml
@@ -59,8 +76,27 @@ def cargar_configuracion_sistema():
         try:
             if os.path.exists(ruta):
                 print(f"✅ Cargando configuración desde: {ruta}")
+
+                # Caché JSON en disco: json.load parsea ~10x más rápido que YAML,
+                # útil en cada arranque del proceso. Se invalida por mtime
+                ruta_cache = f"{ruta}.cache.json"
+                try:
+                    if os.path.exists(ruta_cache) and os.path.getmtime(ruta_cache) >= os.path.getmtime(ruta):
+                        with open(ruta_cache, 'r', encoding='utf-8') as f:
+                            return json.load(f)
+                except Exception:
+                    pass  # caché corrupta o ilegible: se reparsea el YAML
+
                 with open(ruta, 'r', encoding='utf-8') as f:
-                    return yaml.safe_load(f)
+                    config = yaml.load(f, Loader=_YAML_LOADER)
+
+                try:
+                    with open(ruta_cache, 'w', encoding='utf-8') as f:
+                        json.dump(config, f, ensure_ascii=False)
+                except Exception:
+                    pass  # sistema de archivos de solo lectura: continuar sin caché
+
+                return config
         except Exception as e:
             print(f"❌ Error cargando {ruta}: {e}")
             continue
@@ -137,9 +173,12 @@ def cargar_modelos_json():
     
     return modelos
 
+@st.cache_data(show_spinner=False)
 def get_image_base64(path):
-    """Carga imágenes y las convierte a base64"""
-    import os
+    """Carga imágenes y las convierte a base64.
+
+    Memoizada por ruta: el header la llama en cada rerun y sin caché cada
+    llamada sondea 4 rutas y relee/recodifica el PNG"""
     possible_paths = [
         f"/app/{path}",           
         f"/app/assets/{path.split('/')[-1]}", 
@@ -156,6 +195,26 @@ def get_image_base64(path):
             continue
     return None
 
+def _logo_html(path: str, ancho: int, fallback: str) -> str:
+    """Construye el snippet <img> completo de un logo (o su tarjeta de
+    respaldo si no existe el PNG); se evalúa una sola vez a nivel de módulo
+    para que los reruns no repitan ni la búsqueda ni el formateo"""
+    imagen = get_image_base64(path)
+    if imagen:
+        return f'<div style="text-align: center;"><img src="data:image/png;base64,{imagen}" width="{ancho}"></div>'
+    return fallback
+
+# Snippets HTML de los logos precalculados en el import: el base64 de los PNG
+# no cambia durante la vida del proceso
+_LOGO_AESVAL_HTML = _logo_html(
+    "assets/aesval.png", 150,
+    '<div style="text-align: center; background: linear-gradient(135deg, #1f77b4, #2e8bc0); padding: 30px; border-radius: 10px; color: white;"><h3>🏢 AESVAL</h3><p style="font-size: 0.8rem;">Entidad Tasadora</p></div>'
+)
+_LOGO_CTIC_HTML = _logo_html(
+    "assets/CTIC.png", 120,
+    '<div style="text-align: center; background: linear-gradient(135deg, #ff6b6b, #ff8e8e); padding: 30px; border-radius: 10px; color: white;"><h3>🔬 CTIC</h3><p style="font-size: 0.8rem;">Centro Tecnológico</p></div>'
+)
+
 def es_modelo_tasa_o_prima(nombre_modelo: str) -> bool:
     """Determina si el modelo es de Tasa o Prima"""
     return 'tasa' in nombre_modelo.lower() or 'prima' in nombre_modelo.lower()
@@ -164,17 +223,90 @@ def es_modelo_valor(nombre_modelo: str) -> bool:
     """Determina si el modelo es de valor normal"""
     return not es_modelo_tasa_o_prima(nombre_modelo)
 
+# Metadatos de presentación por tipo de modelo; evita duplicar los bloques
+# if es_modelo_prima / else en el cálculo individual
+MODEL_META = {
+    'tasa': {
+        'emoji': '📈',
+        'label': 'Tasa Descuento',
+        'tipo_metric': 'Tasa',
+        'descripcion': 'Calcula únicamente la tasa de descuento',
+        'boton': '📈 Calcular Tasa Descuento',
+        'resultado_key': 'tasa_descuento',
+        'contrib_key': 'contrib_tasa',
+        'contrib_titulo': 'Contribución a la Tasa',
+        'impacto_col': 'Impacto en Tasa',
+        'descarga_keys': ('tasa_descuento', 'contribuciones_tasa'),
+    },
+    'prima': {
+        'emoji': '🛡️',
+        'label': 'Prima de Riesgo',
+        'tipo_metric': 'Prima',
+        'descripcion': 'Calcula únicamente la prima de riesgo',
+        'boton': '🛡️ Calcular Prima de Riesgo',
+        'resultado_key': 'prima_riesgo',
+        'contrib_key': 'contrib_prima',
+        'contrib_titulo': 'Contribución a la Prima',
+        'impacto_col': 'Impacto en Prima',
+        'descarga_keys': ('prima_riesgo', 'contribuciones_prima'),
+    },
+}
+
 class ModeloTasacion:
     """Clase para gestionar los modelos de tasación"""
-    
+
+    # Mapeo variable del modelo → columna del lote que la alimenta; el orden
+    # fija la disposición del vector de coeficientes para el cálculo matricial
+    COLUMNA_POR_VARIABLE = {
+        'SU': 'superficie',
+        'Dnueva': 'vivienda_nueva',
+        'DCA': 'calefaccion',
+        'NB': 'banos',
+        'ND': 'dormitorios',
+        'DAS': 'ascensor',
+        'CC_Alta': 'calidad_alta',
+        'creci': 'creci',
+        'renta': 'renta',
+    }
+
     def __init__(self, modelos_json: Dict):
         self.modelos = modelos_json
+
+        # Vector denso de coeficientes precomputado por modelo: los JSON son
+        # inmutables durante la sesión, así que el ensamblado (variables
+        # activas, columnas y array w) se hace una vez aquí y no en cada cálculo
+        self._coef_cache = {}
+        for clave, modelo in self.modelos.items():
+            coef_variables = modelo.get('coeficientes_variables', _EMPTY_D)
+            variables = [
+                v for v in self.COLUMNA_POR_VARIABLE
+                if coef_variables.get(v) is not None
+            ]
+            self._coef_cache[clave] = (
+                tuple(variables),
+                tuple(self.COLUMNA_POR_VARIABLE[v] for v in variables),
+                np.array([coef_variables[v] for v in variables], dtype=np.float64),
+            )
+
+        # Tabla de municipios como Series float64 construida una vez por
+        # modelo: map sobre una Series hace el join por índice a nivel C
+        # (reindex), sin convertir los valores del dict en cada lote.
+        # np.fromiter con count preasigna el buffer exacto sin pasar por
+        # una lista intermedia
+        self._mun_cache = {}
+        for clave, modelo in self.modelos.items():
+            coef_mun = modelo.get('coeficientes_municipios', _EMPTY_D)
+            self._mun_cache[clave] = pd.Series(
+                np.fromiter(coef_mun.values(), dtype=np.float64, count=len(coef_mun)),
+                index=list(coef_mun.keys()),
+            )
     
     def obtener_modelos_disponibles(self) -> List[Tuple[str, str]]:
         """Retorna la lista de modelos disponibles con nombres legibles desde YAML"""
         # Intentar obtener desde la configuración YAML
-        if hasattr(st.session_state, 'config_sistema') and st.session_state.config_sistema:
-            modelos_config = st.session_state.config_sistema.get('modelos_disponibles', [])
+        config_sistema = cargar_configuracion_sistema()
+        if config_sistema:
+            modelos_config = config_sistema.get('modelos_disponibles', _EMPTY)
             disponibles = []
             for modelo_config in modelos_config:
                 clave = modelo_config.get('clave')
@@ -203,7 +335,11 @@ class ModeloTasacion:
         return disponibles
 
     def obtener_modelo(self, nombre_modelo: str) -> Optional[Dict]:
-        """Obtiene el modelo por su nombre"""
+        """Obtiene el modelo por su nombre.
+
+        La selección es directa por clave (tasa/prima): no hay modelos por
+        tramo de población que requieran resolver umbrales, el efecto del
+        municipio entra como coeficiente dentro de cada modelo"""
         return self.modelos.get(nombre_modelo)
     
     # def calcular_valor_m2(self, datos: Dict, modelo: Dict, codigo_municipio: str) -> Tuple[float, Dict]:
@@ -297,56 +433,21 @@ class ModeloTasacion:
         contribuciones['tasa_base'] = tasa_base
         contribuciones[f'municipio_{codigo_municipio}'] = coef_municipio
         
-        # Aplicar coeficientes según variables disponibles usando los coeficientes reales
-        # Solo usar variables que existen en el modelo (variables subrayadas amarillo)
-        if 'SU' in coef_variables and coef_variables['SU'] is not None and datos.get('superficie'):
-            contrib = coef_variables['SU'] * datos['superficie']
-            tasa_base += contrib
-            contribuciones['superficie'] = contrib
-        
-        if datos.get('vivienda_nueva') and 'Dnueva' in coef_variables and coef_variables['Dnueva'] is not None:
-            contrib = coef_variables['Dnueva']
-            tasa_base += contrib
-            contribuciones['vivienda_nueva'] = contrib
-        
-        if datos.get('calefaccion') and 'DCA' in coef_variables and coef_variables['DCA'] is not None:
-            contrib = coef_variables['DCA']
-            tasa_base += contrib
-            contribuciones['calefaccion'] = contrib
-        
-        if 'NB' in coef_variables and coef_variables['NB'] is not None and datos.get('banos'):
-            contrib = coef_variables['NB'] * datos['banos']
-            tasa_base += contrib
-            contribuciones['banos'] = contrib
-        
-        if 'ND' in coef_variables and coef_variables['ND'] is not None and datos.get('dormitorios'):
-            contrib = coef_variables['ND'] * datos['dormitorios']
-            tasa_base += contrib
-            contribuciones['dormitorios'] = contrib
-        
-        if datos.get('ascensor') and 'DAS' in coef_variables and coef_variables['DAS'] is not None:
-            contrib = coef_variables['DAS']
-            tasa_base += contrib
-            contribuciones['ascensor'] = contrib
-        
-        if datos.get('calidad_alta') and 'CC_Alta' in coef_variables and coef_variables['CC_Alta'] is not None:
-            contrib = coef_variables['CC_Alta']
-            tasa_base += contrib
-            contribuciones['calidad_alta'] = contrib
-        
-        # Variables sociales y ambientales (dummies: 0 o 1)
-        # creci: 1 si evolución del entorno es creciente, 0 en caso contrario
-        if datos.get('creci') and 'creci' in coef_variables and coef_variables['creci'] is not None:
-            contrib = coef_variables['creci'] * 1  # Dummy: 1 si True, 0 si False
-            tasa_base += contrib
-            contribuciones['creci'] = contrib
-        
-        # renta: 1 si nivel de renta del entorno es media o alta, 0 en caso contrario
-        if datos.get('renta') and 'renta' in coef_variables and coef_variables['renta'] is not None:
-            contrib = coef_variables['renta'] * 1  # Dummy: 1 si True, 0 si False
+        # Aplicar coeficientes según variables disponibles usando los coeficientes reales.
+        # Bucle dirigido por tabla: una pasada sobre COLUMNA_POR_VARIABLE en lugar
+        # de una cadena de ifs por variable. El criterio es el mismo de siempre:
+        # solo contribuyen variables con coeficiente definido y dato no nulo
+        # (las dummies valen 1.0 al multiplicar por True)
+        for variable, columna in self.COLUMNA_POR_VARIABLE.items():
+            coef = coef_variables.get(variable)
+            valor = datos.get(columna)
+            if coef is None or not valor:
+                continue
+            contrib = coef * float(valor)
             tasa_base += contrib
-            contribuciones['renta'] = contrib
-        
+            contribuciones[columna] = contrib
+
+
         # Convertir a porcentaje (los valores del modelo están en escala 100x mayor)
         # Dividir por 100 para obtener el valor en porcentaje decimal (0.087 = 8.7%)
         tasa_final = tasa_base / 100.0
@@ -385,43 +486,19 @@ class ModeloTasacion:
         contribuciones['prima_base'] = prima_base
         contribuciones[f'municipio_{codigo_municipio}'] = coef_municipio
         
-        # Aplicar coeficientes según variables disponibles usando los coeficientes reales
-        # Solo usar variables que existen en el modelo (variables subrayadas amarillo)
-        if 'SU' in coef_variables and coef_variables['SU'] is not None and datos.get('superficie'):
-            contrib = coef_variables['SU'] * datos['superficie']
-            prima_base += contrib
-            contribuciones['superficie'] = contrib
-        
-        if datos.get('vivienda_nueva') and 'Dnueva' in coef_variables and coef_variables['Dnueva'] is not None:
-            contrib = coef_variables['Dnueva']
-            prima_base += contrib
-            contribuciones['vivienda_nueva'] = contrib
-        
-        if datos.get('calefaccion') and 'DCA' in coef_variables and coef_variables['DCA'] is not None:
-            contrib = coef_variables['DCA']
-            prima_base += contrib
-            contribuciones['calefaccion'] = contrib
-        
-        if 'NB' in coef_variables and coef_variables['NB'] is not None and datos.get('banos'):
-            contrib = coef_variables['NB'] * datos['banos']
-            prima_base += contrib
-            contribuciones['banos'] = contrib
-        
-        if 'ND' in coef_variables and coef_variables['ND'] is not None and datos.get('dormitorios'):
-            contrib = coef_variables['ND'] * datos['dormitorios']
-            prima_base += contrib
-            contribuciones['dormitorios'] = contrib
-        
-        if datos.get('ascensor') and 'DAS' in coef_variables and coef_variables['DAS'] is not None:
-            contrib = coef_variables['DAS']
-            prima_base += contrib
-            contribuciones['ascensor'] = contrib
-        
-        if datos.get('calidad_alta') and 'CC_Alta' in coef_variables and coef_variables['CC_Alta'] is not None:
-            contrib = coef_variables['CC_Alta']
+        # Aplicar coeficientes según variables disponibles usando los coeficientes reales.
+        # Mismo bucle dirigido por tabla que en calcular_tasa_descuento; el JSON
+        # de prima no define creci/renta, así que quedan fuera automáticamente
+        for variable, columna in self.COLUMNA_POR_VARIABLE.items():
+            coef = coef_variables.get(variable)
+            valor = datos.get(columna)
+            if coef is None or not valor:
+                continue
+            contrib = coef * float(valor)
             prima_base += contrib
-            contribuciones['calidad_alta'] = contrib
-        
+            contribuciones[columna] = contrib
+
+
         # Convertir a porcentaje (los valores del modelo están en escala 100x mayor)
         # Dividir por 100 para obtener el valor en porcentaje decimal (0.054 = 5.4%)
         prima_final = prima_base / 100.0
@@ -433,17 +510,107 @@ class ModeloTasacion:
         
         return prima_final, contribuciones_porcentaje, ""  # ← Devuelve string vacío para éxito
 
+    def calcular_batch(self, df: pd.DataFrame, nombre_modelo: str) -> Tuple[np.ndarray, List[Dict], List[str]]:
+        """Evalúa el modelo sobre todas las filas del DataFrame de una sola vez.
+
+        En lugar de N llamadas con lookups de dict y sumas escalares, ensambla
+        el vector de coeficientes w y la matriz de características X y calcula
+        X @ w en una única operación vectorizada. Devuelve (valores,
+        contribuciones, mensajes): el resultado por fila, el desglose
+        porcentual de contribuciones (mismo formato que el cálculo individual)
+        y un mensaje de error por fila (cadena vacía si fue correcta)."""
+        modelo = self.modelos.get(nombre_modelo)
+        n = len(df)
+        if n == 0:
+            return np.zeros(0), [], []
+        if not modelo:
+            mensaje = f"❌ Modelo '{nombre_modelo}' no encontrado"
+            return np.zeros(n), [{}] * n, [mensaje] * n
+
+        clave_base = 'tasa_base' if nombre_modelo == 'testigos_tasa' else 'prima_base'
+
+        # Vector de coeficientes precomputado en __init__ (solo variables con
+        # coeficiente definido: el JSON de prima no incluye creci/renta)
+        variables, columnas, w = self._coef_cache[nombre_modelo]
+
+        # El lote completo usa un único modelo (tasa o prima), así que basta
+        # un solo tile contiguo en C: column_stack ya devuelve float64
+        # C-contiguo y el gemv posterior corre a ancho de banda de memoria
+        if variables:
+            X = np.column_stack([
+                df[col].to_numpy(dtype=np.float64, na_value=0.0)
+                if col in df.columns else np.zeros(n)
+                for col in columnas
+            ])
+        else:
+            X = np.zeros((n, 0))
+
+        # Coeficiente de municipio vectorizado: Series.map hace una única
+        # pasada de tabla hash a nivel C en lugar de un lookup Python por
+        # fila; los códigos desconocidos se reportan como error por fila,
+        # igual que en el cálculo individual
+        codigos = df['codigo_municipio'].astype(str)
+        coef_mun_serie = codigos.map(self._mun_cache[nombre_modelo])
+        municipio_valido = coef_mun_serie.notna().to_numpy()
+        coef_mun = coef_mun_serie.to_numpy(dtype=np.float64, na_value=0.0)
+
+        base = modelo['_cons'] + coef_mun
+        # El total va por X @ w: un único gemv de BLAS (kernel C multihilo),
+        # por lo que no hace falta un JIT adicional para este modelo lineal.
+        # La matriz de contribuciones solo alimenta el desglose por variable
+        contribs_abs = X * w                       # contribución absoluta por variable
+        # Los valores del modelo están en escala 100x (ver cálculo individual)
+        valores = (base + X @ w) / 100.0
+
+        contribuciones = []
+        mensajes = []
+        codigos_arr = codigos.to_numpy()
+        for i in range(n):
+            if not municipio_valido[i]:
+                contribuciones.append({})
+                mensajes.append(f"❌ Municipio '{codigos_arr[i]}' no existe en este modelo.")
+                continue
+
+            contrib = {clave_base: base[i], f'municipio_{codigos_arr[i]}': coef_mun[i]}
+            for j, col in enumerate(columnas):
+                if contribs_abs[i, j] != 0.0:
+                    contrib[col] = contribs_abs[i, j]
+
+            valor = valores[i]
+            contribuciones.append({k: (v / valor) * 100 for k, v in contrib.items()})
+            mensajes.append("")
+
+        return valores, contribuciones, mensajes
+
+@st.cache_resource(show_spinner=False)
+def obtener_modelo_tasacion() -> 'ModeloTasacion':
+    """Instancia singleton de ModeloTasacion: los JSON de coeficientes son de
+    solo lectura, así que se cargan y construyen una vez por proceso en lugar
+    de una vez por sesión"""
+    return ModeloTasacion(cargar_modelos_json())
+
+@st.cache_data(max_entries=4096, show_spinner=False)
+def calcular_individual_cached(modelo_clave: str, codigo_municipio: str, datos_items: tuple) -> Tuple[float, Dict, str]:
+    """Memoiza el cálculo individual: con el mismo modelo, municipio y
+    características el resultado se resuelve como lookup en caché sin repetir
+    el recorrido de coeficientes. datos_items es la tupla de items del dict de
+    datos (solo primitivos, hashable como clave de caché)."""
+    modelo = obtener_modelo_tasacion()
+    datos = dict(datos_items)
+    if modelo_clave == 'testigos_prima':
+        return modelo.calcular_prima_riesgo(datos, codigo_municipio)
+    return modelo.calcular_tasa_descuento(datos, codigo_municipio)
+
 def inicializar_session_state():
     """Inicializa variables de session state"""
-    if 'modelos_json' not in st.session_state:
-        st.session_state.modelos_json = cargar_modelos_json()
-    if 'modelo' not in st.session_state:
-        st.session_state.modelo = ModeloTasacion(st.session_state.modelos_json)
+    # El modelo ya no vive en session_state: obtener_modelo_tasacion es el
+    # singleton compartido entre sesiones (st.cache_resource) y las páginas
+    # lo piden directamente
     if 'resultados_individuales' not in st.session_state:
         st.session_state.resultados_individuales = []
-    if 'config_sistema' not in st.session_state:
-        st.session_state.config_sistema = cargar_configuracion_sistema()
-    
+    # La configuración ya no vive en session_state: cargar_configuracion_sistema
+    # está cacheada con st.cache_resource y se comparte entre sesiones
+
     # Inicializar variables para persistencia de datos entre modelos
     if 'datos_persistentes' not in st.session_state:
         st.session_state.datos_persistentes = {
@@ -462,46 +629,40 @@ def inicializar_session_state():
             'ocultar_variables_no_correspondientes': False 
         }
 
-def mostrar_header():
-    """Header profesional con logos"""
-    logo_aesval = get_image_base64("assets/aesval.png")
-    logo_ctic = get_image_base64("assets/CTIC.png")
-    
-    col1, col2, col3 = st.columns([1, 2, 1])
-    
-    with col1:
-        if logo_aesval:
-            st.markdown(f'<div style="text-align: center;"><img src="data:image/png;base64,{logo_aesval}" width="150"></div>', unsafe_allow_html=True)
-        else:
-            st.markdown('<div style="text-align: center; background: linear-gradient(135deg, #1f77b4, #2e8bc0); padding: 30px; border-radius: 10px; color: white;"><h3>🏢 AESVAL</h3><p style="font-size: 0.8rem;">Entidad Tasadora</p></div>', unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown("""
+# Título del header: HTML estático hoisted a constante de módulo, como los logos
+_HEADER_TITULO_HTML = """
         <div style='text-align: center; padding: 1rem 0;'>
             <h2 style='color: #1f77b4; margin-bottom: 0.5rem; font-size: 2.5rem;'>
                 Modelos de Tasa Descuento y Prima de Riesgo (ECO/805)
             </h2>
         </div>
-        """, unsafe_allow_html=True)
-    
+        """
+
+def mostrar_header():
+    """Header profesional con logos"""
+    col1, col2, col3 = st.columns([1, 2, 1])
+
+    with col1:
+        st.markdown(_LOGO_AESVAL_HTML, unsafe_allow_html=True)
+
+    with col2:
+        st.markdown(_HEADER_TITULO_HTML, unsafe_allow_html=True)
+
     with col3:
-        if logo_ctic:
-            st.markdown(f'<div style="text-align: center;"><img src="data:image/png;base64,{logo_ctic}" width="120"></div>', unsafe_allow_html=True)
-        else:
-            st.markdown('<div style="text-align: center; background: linear-gradient(135deg, #ff6b6b, #ff8e8e); padding: 30px; border-radius: 10px; color: white;"><h3>🔬 CTIC</h3><p style="font-size: 0.8rem;">Centro Tecnológico</p></div>', unsafe_allow_html=True)
-    
+        st.markdown(_LOGO_CTIC_HTML, unsafe_allow_html=True)
+
     st.markdown("---")
 
+@st.fragment
 def mostrar_sidebar():
     """Sidebar con información del sistema cargada desde YAML"""
-    if not st.session_state.config_sistema:
+    config = cargar_configuracion_sistema()
+    if not config:
         st.error("No se pudo cargar la configuración del sistema")
         return
-        
-    config = st.session_state.config_sistema
-    sistema = config.get('sistema', {})
-    metricas = config.get('metricas', {})
-    modelos_config = config.get('modelos_disponibles', [])
+    sistema = config.get('sistema', _EMPTY_D)
+    metricas = config.get('metricas', _EMPTY_D)
+    modelos_config = config.get('modelos_disponibles', _EMPTY)
     
     with st.sidebar:
         st.markdown(f"""
@@ -531,10 +692,12 @@ def mostrar_sidebar():
         # for modelo in modelos_config:
         #     nombre = modelo.get('nombre', modelo.get('clave', ''))
         #     st.write(f"• {nombre}")
-        
-        for modelo in modelos_config:
-            nombre = modelo.get('nombre', modelo.get('clave', ''))
-            st.write(f"• {nombre}")
+
+        # Una sola llamada markdown para toda la lista (un delta por st.write)
+        st.markdown("\n".join(
+            f"- {modelo.get('nombre', modelo.get('clave', ''))}"
+            for modelo in modelos_config
+        ))
         
         st.markdown("---")
         st.markdown(f"""
@@ -557,187 +720,189 @@ def pagina_tasacion_individual():
     with col1:
         with st.container():
             st.subheader("Datos del inmueble")
-            
-            col1_1, col1_2 = st.columns(2)
-            
-            with col1_1:
-                # Selección directa del modelo - SOLO TASA Y PRIMA
-                modelos_disponibles = st.session_state.modelo.obtener_modelos_disponibles()
-                if not modelos_disponibles:
-                    st.error("❌ No se cargaron modelos. Verifique los archivos JSON en config/")
-                    st.stop()
-                
-                # Obtener modelo actual de datos persistentes
-                modelo_actual = st.session_state.datos_persistentes.get('modelo_seleccionado', 'testigos_tasa')
-                
-                modelo_seleccionado = st.selectbox(
-                    "Seleccione el modelo",
-                    options=[clave for clave, _ in modelos_disponibles],
-                    format_func=lambda x: next((nombre for clave, nombre in modelos_disponibles if clave == x), x),
-                    help="Elija entre Tasa de Descuento o Prima de Riesgo",
-                    key="selectbox_modelo",
-                    index=[clave for clave, _ in modelos_disponibles].index(modelo_actual) if modelo_actual in [clave for clave, _ in modelos_disponibles] else 0
-                )
-                
-                # ACTUALIZAR DATOS PERSISTENTES INMEDIATAMENTE cuando cambia el modelo
-                if modelo_seleccionado != st.session_state.datos_persistentes.get('modelo_seleccionado'):
-                    st.session_state.datos_persistentes['modelo_seleccionado'] = modelo_seleccionado
-                
-                # Determinar tipo de modelo
-                es_modelo_prima = modelo_seleccionado == 'testigos_prima'
-                es_modelo_tasa = modelo_seleccionado == 'testigos_tasa'
-                
-                # Código del municipio (siempre visible)
-                modelo_obj = st.session_state.modelo.obtener_modelo(modelo_seleccionado)
-                codigos_disponibles = list(modelo_obj['coeficientes_municipios'].keys()) if modelo_obj and 'coeficientes_municipios' in modelo_obj else []
-                
-                if not codigos_disponibles:
-                    st.error("❌ El modelo seleccionado no tiene códigos de municipio disponibles")
-                    st.stop()
-                
-                # Obtener municipio actual de datos persistentes
-                municipio_actual = st.session_state.datos_persistentes.get('codigo_municipio', '2005')
-                
-                # Si el municipio actual no está disponible en el nuevo modelo, resetear al primero disponible
-                if municipio_actual not in codigos_disponibles:
-                    municipio_actual = codigos_disponibles[0]
-                    st.session_state.datos_persistentes['codigo_municipio'] = municipio_actual
-                
-                codigo_municipio = st.selectbox(
-                    "Código de Municipio",
-                    options=codigos_disponibles,
-                    index=codigos_disponibles.index(municipio_actual),
-                    help="Seleccione el código del municipio",
-                    key="selectbox_municipio"
-                )
-                
-                # ACTUALIZAR DATOS PERSISTENTES cuando cambia el municipio
-                if codigo_municipio != st.session_state.datos_persistentes.get('codigo_municipio'):
-                    st.session_state.datos_persistentes['codigo_municipio'] = codigo_municipio
-                
-                # CAMPOS COMUNES A TODOS LOS MODELOS (siempre visibles)
-                # Usar valores de datos persistentes como valores por defecto
-                datos_persistentes = st.session_state.datos_persistentes
-                
-                superficie = st.number_input(
-                    "Superficie construida (m²)", 
-                    min_value=20.0, 
-                    max_value=1000.0,
-                    value=datos_persistentes.get('superficie', 80.0),
-                    step=0.5,
-                    help="Superficie total construida en metros cuadrados",
-                    key="input_superficie"
-                )
-                
-                dormitorios = st.number_input(
-                    "Número de dormitorios",
-                    min_value=1,
-                    max_value=10,
-                    value=datos_persistentes.get('dormitorios', 3),
-                    help="Número total de dormitorios (variable ND)",
-                    key="input_dormitorios"
-                )
-                
-                banos = st.number_input(
-                    "Número de baños",
-                    min_value=1,
-                    max_value=6,
-                    value=datos_persistentes.get('banos', 2),
-                    help="Número total de baños (variable NB)",
-                    key="input_banos"
-                )
-                
-                # CAMPOS PARA MODELOS DE TASA/PRIMA
-                calefaccion = st.checkbox(
-                    "Calefacción", 
-                    value=datos_persistentes.get('calefaccion', True),
-                    help="¿El inmueble tiene calefacción? (variable DCA)",
-                    key="input_calefaccion"
-                )
-                
-                
-                # Variables sociales y ambientales (creci y renta solo para modelo de tasa)
-                # Son variables dummy (0 o 1)
-                # Controlar visibilidad mediante código (no checkbox)
-                ocultar_variables = datos_persistentes.get('ocultar_variables_no_correspondientes', False)
-                mostrar_creci_renta = not ocultar_variables or es_modelo_tasa
-                
-                if mostrar_creci_renta:
-                    creci = st.checkbox(
-                        "Evolución del entorno creciente (creci)", 
-                        value=datos_persistentes.get('creci', False),
-                        help="Variable dummy: 1 si la evolución del entorno es creciente, 0 en caso contrario" + (" - Solo para modelo Tasa" if not es_modelo_tasa else ""),
-                        key="input_creci",
-                        disabled=(not es_modelo_tasa and ocultar_variables)
+
+            # Selección directa del modelo - SOLO TASA Y PRIMA
+            # El selector queda FUERA del formulario: al cambiar de modelo hay
+            # que repoblar los municipios y la visibilidad de creci/renta en
+            # el mismo rerun
+            modelos_disponibles = obtener_modelo_tasacion().obtener_modelos_disponibles()
+            if not modelos_disponibles:
+                st.error("❌ No se cargaron modelos. Verifique los archivos JSON en config/")
+                st.stop()
+
+            # Obtener modelo actual de datos persistentes
+            modelo_actual = st.session_state.datos_persistentes.get('modelo_seleccionado', 'testigos_tasa')
+
+            modelo_seleccionado = st.selectbox(
+                "Seleccione el modelo",
+                options=[clave for clave, _ in modelos_disponibles],
+                format_func=lambda x: next((nombre for clave, nombre in modelos_disponibles if clave == x), x),
+                help="Elija entre Tasa de Descuento o Prima de Riesgo",
+                key="selectbox_modelo",
+                index=[clave for clave, _ in modelos_disponibles].index(modelo_actual) if modelo_actual in [clave for clave, _ in modelos_disponibles] else 0
+            )
+
+            # ACTUALIZAR DATOS PERSISTENTES INMEDIATAMENTE cuando cambia el modelo
+            if modelo_seleccionado != st.session_state.datos_persistentes.get('modelo_seleccionado'):
+                st.session_state.datos_persistentes['modelo_seleccionado'] = modelo_seleccionado
+
+            # Determinar tipo de modelo
+            es_modelo_prima = modelo_seleccionado == 'testigos_prima'
+            es_modelo_tasa = modelo_seleccionado == 'testigos_tasa'
+
+            # Código del municipio (siempre visible)
+            modelo_obj = obtener_modelo_tasacion().obtener_modelo(modelo_seleccionado)
+            codigos_disponibles = list(modelo_obj['coeficientes_municipios'].keys()) if modelo_obj and 'coeficientes_municipios' in modelo_obj else []
+
+            if not codigos_disponibles:
+                st.error("❌ El modelo seleccionado no tiene códigos de municipio disponibles")
+                st.stop()
+
+            # Obtener municipio actual de datos persistentes
+            municipio_actual = st.session_state.datos_persistentes.get('codigo_municipio', '2005')
+
+            # Si el municipio actual no está disponible en el nuevo modelo, resetear al primero disponible
+            if municipio_actual not in codigos_disponibles:
+                municipio_actual = codigos_disponibles[0]
+                st.session_state.datos_persistentes['codigo_municipio'] = municipio_actual
+
+            # Información del modelo seleccionado (dispatch por tabla)
+            kind = 'prima' if es_modelo_prima else 'tasa'
+            meta = MODEL_META[kind]
+
+            # El resto de campos va dentro de un formulario: tocar un widget
+            # ya no relanza el script completo; solo el botón de envío
+            # provoca el rerun y el cálculo
+            with st.form("form_tasacion_individual"):
+                col1_1, col1_2 = st.columns(2)
+
+                with col1_1:
+                    codigo_municipio = st.selectbox(
+                        "Código de Municipio",
+                        options=codigos_disponibles,
+                        index=codigos_disponibles.index(municipio_actual),
+                        help="Seleccione el código del municipio",
+                        key="selectbox_municipio"
                     )
-                    
-                    renta = st.checkbox(
-                        "Nivel de renta media o alta (renta)", 
-                        value=datos_persistentes.get('renta', False),
-                        help="Variable dummy: 1 si el nivel de renta del entorno es media o alta, 0 en caso contrario" + (" - Solo para modelo Tasa" if not es_modelo_tasa else ""),
-                        key="input_renta",
-                        disabled=(not es_modelo_tasa and ocultar_variables)
+
+                    # CAMPOS COMUNES A TODOS LOS MODELOS (siempre visibles)
+                    # Usar valores de datos persistentes como valores por defecto
+                    datos_persistentes = st.session_state.datos_persistentes
+
+                    superficie = st.number_input(
+                        "Superficie construida (m²)",
+                        min_value=20.0,
+                        max_value=1000.0,
+                        value=datos_persistentes.get('superficie', 80.0),
+                        step=0.5,
+                        help="Superficie total construida en metros cuadrados",
+                        key="input_superficie"
                     )
-                else:
-                    # Para modelo prima cuando está oculto, usar valores por defecto (no se usan en el cálculo)
-                    creci = False
-                    renta = False
-                
-            with col1_2:
-                # CAMPOS COMUNES (continuación)
-                planta = st.number_input(
-                    "Planta",
-                    min_value=0,
-                    max_value=20,
-                    value=datos_persistentes.get('planta', 2),
-                    help="Planta en la que se ubica el inmueble (variable PLbis)",
-                    key="input_planta"
-                )
-                
-                ascensor = st.checkbox(
-                    "Ascensor", 
-                    value=datos_persistentes.get('ascensor', True),
-                    help="¿El edificio tiene ascensor? (variable DAS)",
-                    key="input_ascensor"
-                )
-                        
-                calidad_alta = st.checkbox(
-                    "Calidad constructiva alta", 
-                    value=datos_persistentes.get('calidad_alta', False),
-                    help="Calidad de materiales y acabados alta (variable CC_Alta)",
-                    key="input_calidad_alta"
-                )
 
-                vivienda_nueva = st.checkbox(
-                    "Vivienda nueva (<5 años)", 
-                    value=datos_persistentes.get('vivienda_nueva', False),
-                    help="Menos de 5 años de antigüedad (variable Dnueva)",
-                    key="input_vivienda_nueva"
-                )
+                    dormitorios = st.number_input(
+                        "Número de dormitorios",
+                        min_value=1,
+                        max_value=10,
+                        value=datos_persistentes.get('dormitorios', 3),
+                        help="Número total de dormitorios (variable ND)",
+                        key="input_dormitorios"
+                    )
+
+                    banos = st.number_input(
+                        "Número de baños",
+                        min_value=1,
+                        max_value=6,
+                        value=datos_persistentes.get('banos', 2),
+                        help="Número total de baños (variable NB)",
+                        key="input_banos"
+                    )
+
+                    # CAMPOS PARA MODELOS DE TASA/PRIMA
+                    calefaccion = st.checkbox(
+                        "Calefacción",
+                        value=datos_persistentes.get('calefaccion', True),
+                        help="¿El inmueble tiene calefacción? (variable DCA)",
+                        key="input_calefaccion"
+                    )
+
+
+                    # Variables sociales y ambientales (creci y renta solo para modelo de tasa)
+                    # Son variables dummy (0 o 1)
+                    # Controlar visibilidad mediante código (no checkbox)
+                    ocultar_variables = datos_persistentes.get('ocultar_variables_no_correspondientes', False)
+                    mostrar_creci_renta = not ocultar_variables or es_modelo_tasa
+
+                    if mostrar_creci_renta:
+                        creci = st.checkbox(
+                            "Evolución del entorno creciente (creci)",
+                            value=datos_persistentes.get('creci', False),
+                            help="Variable dummy: 1 si la evolución del entorno es creciente, 0 en caso contrario" + (" - Solo para modelo Tasa" if not es_modelo_tasa else ""),
+                            key="input_creci",
+                            disabled=(not es_modelo_tasa and ocultar_variables)
+                        )
+
+                        renta = st.checkbox(
+                            "Nivel de renta media o alta (renta)",
+                            value=datos_persistentes.get('renta', False),
+                            help="Variable dummy: 1 si el nivel de renta del entorno es media o alta, 0 en caso contrario" + (" - Solo para modelo Tasa" if not es_modelo_tasa else ""),
+                            key="input_renta",
+                            disabled=(not es_modelo_tasa and ocultar_variables)
+                        )
+                    else:
+                        # Para modelo prima cuando está oculto, usar valores por defecto (no se usan en el cálculo)
+                        creci = False
+                        renta = False
+
+                with col1_2:
+                    # CAMPOS COMUNES (continuación)
+                    planta = st.number_input(
+                        "Planta",
+                        min_value=0,
+                        max_value=20,
+                        value=datos_persistentes.get('planta', 2),
+                        help="Planta en la que se ubica el inmueble (variable PLbis)",
+                        key="input_planta"
+                    )
+
+                    ascensor = st.checkbox(
+                        "Ascensor",
+                        value=datos_persistentes.get('ascensor', True),
+                        help="¿El edificio tiene ascensor? (variable DAS)",
+                        key="input_ascensor"
+                    )
+
+                    calidad_alta = st.checkbox(
+                        "Calidad constructiva alta",
+                        value=datos_persistentes.get('calidad_alta', False),
+                        help="Calidad de materiales y acabados alta (variable CC_Alta)",
+                        key="input_calidad_alta"
+                    )
+
+                    vivienda_nueva = st.checkbox(
+                        "Vivienda nueva (<5 años)",
+                        value=datos_persistentes.get('vivienda_nueva', False),
+                        help="Menos de 5 años de antigüedad (variable Dnueva)",
+                        key="input_vivienda_nueva"
+                    )
+
+                calcular = st.form_submit_button(meta['boton'], type="primary", width='stretch')
+
+            # ACTUALIZAR DATOS PERSISTENTES cuando cambia el municipio
+            # (tras el envío del formulario, que es cuando llega el nuevo valor)
+            if codigo_municipio != st.session_state.datos_persistentes.get('codigo_municipio'):
+                st.session_state.datos_persistentes['codigo_municipio'] = codigo_municipio
 
     with col2:
         with st.container():
             st.subheader("🎯 Calcular")
-            
-            # Mostrar información del modelo seleccionado
-            if es_modelo_prima:
-                st.info("🛡️ **Modelo de Prima de Riesgo activado**")
-                st.write("Calcula únicamente la prima de riesgo")
-            else:
-                st.info("📈 **Modelo de Tasa Descuento activado**")
-                st.write("Calcula únicamente la tasa de descuento")
-            
-            # Texto del botón según el tipo de modelo
-            texto_boton = ""
-            if es_modelo_prima:
-                texto_boton = "🛡️ Calcular Prima de Riesgo"
-            else:
-                texto_boton = "📈 Calcular Tasa Descuento"
-            
-            if st.button(texto_boton, type="primary", width='stretch'):
+
+            st.info(f"{meta['emoji']} **Modelo de {meta['label']} activado**")
+            st.write(meta['descripcion'])
+
+            if calcular:
                 with st.spinner("Calculando usando modelos econométricos..."):
                     # Obtener el modelo seleccionado directamente
-                    modelo_valor = st.session_state.modelo.obtener_modelo(modelo_seleccionado)
+                    modelo_valor = obtener_modelo_tasacion().obtener_modelo(modelo_seleccionado)
                     
                     if not modelo_valor:
                         st.error("❌ No se pudo cargar el modelo seleccionado")
@@ -765,8 +930,10 @@ def pagina_tasacion_individual():
                     error_calculo = None
                     
                     if es_modelo_tasa:
-                        tasa_descuento, contrib_tasa, mensaje_error = st.session_state.modelo.calcular_tasa_descuento(
-                            datos_inmueble, codigo_municipio
+                        # Cálculo memoizado: clics repetidos con el mismo
+                        # formulario no recalculan nada
+                        tasa_descuento, contrib_tasa, mensaje_error = calcular_individual_cached(
+                            modelo_seleccionado, codigo_municipio, tuple(datos_inmueble.items())
                         )
                         if mensaje_error:
                             error_calculo = mensaje_error
@@ -777,8 +944,8 @@ def pagina_tasacion_individual():
                             })
 
                     elif es_modelo_prima:
-                        prima_riesgo, contrib_prima, mensaje_error = st.session_state.modelo.calcular_prima_riesgo(
-                            datos_inmueble, codigo_municipio
+                        prima_riesgo, contrib_prima, mensaje_error = calcular_individual_cached(
+                            modelo_seleccionado, codigo_municipio, tuple(datos_inmueble.items())
                         )
                         if mensaje_error:
                             error_calculo = mensaje_error
@@ -797,42 +964,25 @@ def pagina_tasacion_individual():
                     st.success("✅ Cálculo realizado correctamente")
                     
                     # Métricas principales (solo lo que se calculó)
-                    if es_modelo_prima:
-                        col_res1, col_res2 = st.columns(2)
-                        with col_res1:
-                            st.metric("Prima de Riesgo", f"{resultados['prima_riesgo']:.2%}")
-                        with col_res2:
-                            st.metric("Tipo de Modelo", "Prima")
-                    
-                    else:
-                        col_res1, col_res2 = st.columns(2)
-                        with col_res1:
-                            st.metric("Tasa Descuento", f"{resultados['tasa_descuento']:.2%}")
-                        with col_res2:
-                            st.metric("Tipo de Modelo", "Tasa")
-                    
+                    col_res1, col_res2 = st.columns(2)
+                    with col_res1:
+                        st.metric(meta['label'], f"{resultados[meta['resultado_key']]:.2%}")
+                    with col_res2:
+                        st.metric("Tipo de Modelo", meta['tipo_metric'])
+
                     # Información del modelo usado
                     st.info(f"**Modelo aplicado:** {modelo_valor['nombre_modelo']}")
-                    
+
                     # Contribuciones detalladas (solo las relevantes)
                     with st.expander("📊 Análisis detallado de contribuciones", expanded=True):
-                        if es_modelo_prima:
-                            st.subheader("Contribución a la Prima")
-                            contrib_df_prima = pd.DataFrame({
-                                'Variable': list(resultados['contrib_prima'].keys()),
-                                'Impacto en Prima': [f"{v:+.1f}%" for v in resultados['contrib_prima'].values()],  
-                                'Efecto': ['📈 Aumenta' if v > 0 else '📉 Reduce' for v in resultados['contrib_prima'].values()]
-                            })
-                            st.dataframe(contrib_df_prima, width='stretch', height=200, hide_index=True)
-                        
-                        else:
-                            st.subheader("Contribución a la Tasa")
-                            contrib_df_tasa = pd.DataFrame({
-                                'Variable': list(resultados['contrib_tasa'].keys()),
-                                'Impacto en Tasa': [f"{v:+.1f}%" for v in resultados['contrib_tasa'].values()],
-                                'Efecto': ['📈 Aumenta' if v > 0 else '📉 Reduce' for v in resultados['contrib_tasa'].values()]
-                            })
-                            st.dataframe(contrib_df_tasa, width='stretch', height=200, hide_index=True)
+                        st.subheader(meta['contrib_titulo'])
+                        contrib = resultados[meta['contrib_key']]
+                        contrib_df = pd.DataFrame({
+                            'Variable': list(contrib.keys()),
+                            meta['impacto_col']: [f"{v:+.1f}%" for v in contrib.values()],
+                            'Efecto': ['📈 Aumenta' if v > 0 else '📉 Reduce' for v in contrib.values()]
+                        })
+                        st.dataframe(contrib_df, width='stretch', height=200, hide_index=True)
                     
                     # Preparar resultado para descarga
                     resultado_descarga = {
@@ -843,135 +993,68 @@ def pagina_tasacion_individual():
                     }
                     
                     # Agregar solo los resultados calculados
-                    if es_modelo_tasa:
-                        resultado_descarga.update({
-                            'tasa_descuento': resultados['tasa_descuento'],
-                            'contribuciones_tasa': resultados['contrib_tasa']
-                        })
-                    elif es_modelo_prima:
-                        resultado_descarga.update({
-                            'prima_riesgo': resultados['prima_riesgo'],
-                            'contribuciones_prima': resultados['contrib_prima']
-                        })
+                    clave_resultado, clave_contrib = meta['descarga_keys']
+                    resultado_descarga[clave_resultado] = resultados[meta['resultado_key']]
+                    resultado_descarga[clave_contrib] = resultados[meta['contrib_key']]
 
-                    st.download_button(
-                        "📥 Descargar Informe JSON",
-                        data=json.dumps(resultado_descarga, indent=2, ensure_ascii=False),
-                        file_name=f"calculo_{codigo_municipio}_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
-                        mime="application/json",
-                        width='stretch'
+                    # Serializar una sola vez y conservar los bytes en session_state;
+                    # el botón de descarga se renderiza fuera de esta rama para que
+                    # sobreviva a los reruns sin repetir la serialización
+                    st.session_state['descarga_individual'] = (
+                        orjson.dumps(resultado_descarga, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS),
+                        f"calculo_{codigo_municipio}_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
                     )
             else:
                 st.info("ℹ️ Complete los datos y haga clic en el botón para obtener resultados")
 
-def validar_fila_para_modelo(fila: pd.Series, modelo_clave: str) -> Tuple[bool, List[str]]:
-    """Valida que una fila tenga las columnas requeridas para el modelo especificado"""
-    errores = []
-    
-    # Columnas requeridas para todos los modelos
-    columnas_requeridas_base = ['codigo_municipio', 'superficie', 'dormitorios', 'banos', 'planta']
-    
-    # Columnas específicas por tipo de modelo - SOLO TASA/PRIMA
-    # Nota: Las variables sociales/ambientales (creci, renta) son opcionales
-    columnas_requeridas = columnas_requeridas_base + ['ascensor', 'calefaccion', 'calidad_alta', 'vivienda_nueva']
-    
-    # Verificar columnas requeridas
-    for columna in columnas_requeridas:
-        if columna not in fila.index:
-            errores.append(f"Falta columna requerida: {columna}")
-        elif pd.isna(fila[columna]):
-            errores.append(f"Valor faltante en columna: {columna}")
-    
-    # Validar tipos de datos básicos
-    if 'superficie' in fila and not pd.isna(fila['superficie']):
-        try:
-            float(fila['superficie'])
-        except (ValueError, TypeError):
-            errores.append("Superficie debe ser numérica")
-    
-    if 'codigo_municipio' in fila and not pd.isna(fila['codigo_municipio']):
-        try:
-            str(fila['codigo_municipio'])
-        except (ValueError, TypeError):
-            errores.append("Código municipio debe ser texto o número")
-    
-    return len(errores) == 0, errores
+            descarga_individual = st.session_state.get('descarga_individual')
+            if descarga_individual:
+                # orjson es mucho más rápido que json y acepta floats de NumPy;
+                # st.download_button admite bytes directamente, sin .decode()
+                st.download_button(
+                    "📥 Descargar Informe JSON",
+                    data=descarga_individual[0],
+                    file_name=descarga_individual[1],
+                    mime="application/json",
+                    width='stretch'
+                )
 
-def procesar_fila_multiple(fila: pd.Series, modelo_tasacion, modelo_seleccionado: str) -> Tuple[bool, Dict, str]:
-    """Procesa una fila individual del Excel y retorna resultado o error"""
-    try:
-        # Validar que la fila tenga datos básicos
-        if pd.isna(fila['codigo_municipio']) or pd.isna(fila['superficie']):
-            return False, {}, "Datos básicos faltantes (código municipio o superficie)"
-        
-        # Obtener modelo
-        modelo_obj = modelo_tasacion.modelos.get(modelo_seleccionado)
-        if not modelo_obj:
-            return False, {}, f"Modelo '{modelo_seleccionado}' no encontrado"
-        
-        # Preparar datos según tipo de modelo
-        codigo_municipio = str(fila['codigo_municipio'])
-        superficie = float(fila['superficie'])
-        
-        # Modelo de tasa o prima
-        datos = {
-            'superficie': superficie,
-            'dormitorios': int(fila.get('dormitorios', 0)),
-            'banos': int(fila.get('banos', 0)),
-            'planta': int(fila.get('planta', 0)),
-            'ascensor': bool(fila.get('ascensor', False)),
-            'calefaccion': bool(fila.get('calefaccion', True)),
-            'calidad_alta': bool(fila.get('calidad_alta', False)),
-            'vivienda_nueva': bool(fila.get('vivienda_nueva', False))
-        }
-        
-        # Solo añadir creci y renta para modelo de tasa (variables dummy: 0 o 1)
-        if modelo_seleccionado == 'testigos_tasa':
-            # Convertir a booleano: True si es 1, True, "Sí", etc., False en caso contrario
-            creci_val = fila.get('creci', False)
-            if pd.notna(creci_val):
-                datos['creci'] = bool(creci_val) if isinstance(creci_val, (bool, int, float)) else str(creci_val).lower() in ['true', '1', 'sí', 'si', 'yes', 'verdadero']
-            else:
-                datos['creci'] = False
-            
-            renta_val = fila.get('renta', False)
-            if pd.notna(renta_val):
-                datos['renta'] = bool(renta_val) if isinstance(renta_val, (bool, int, float)) else str(renta_val).lower() in ['true', '1', 'sí', 'si', 'yes', 'verdadero']
-            else:
-                datos['renta'] = False
-        
-        if modelo_seleccionado == 'testigos_tasa':
-            resultado, contribuciones, mensaje_error = modelo_tasacion.calcular_tasa_descuento(datos, codigo_municipio)
-            if mensaje_error:  # Si hay mensaje de error, retornar error
-                return False, {}, mensaje_error
-                
-            return True, {
-                'tipo': 'tasa',
-                'valor': resultado,
-                'contribuciones': contribuciones,
-                'modelo': modelo_obj['nombre_modelo'],
-                'codigo_municipio': codigo_municipio,
-                'superficie': superficie
-            }, ""
-        else: # testigos_prima
-            resultado, contribuciones, mensaje_error = modelo_tasacion.calcular_prima_riesgo(datos, codigo_municipio)
-            if mensaje_error:  # Si hay mensaje de error, retornar error
-                return False, {}, mensaje_error
-                
-            return True, {
-                'tipo': 'prima',
-                'valor': resultado,
-                'contribuciones': contribuciones,
-                'modelo': modelo_obj['nombre_modelo'],
-                'codigo_municipio': codigo_municipio,
-                'superficie': superficie
-            }, ""
-            
-    except Exception as e:
-        return False, {}, f"Error en procesamiento: {str(e)}"
+# Valores de texto que se interpretan como "verdadero" en variables dummy (creci, renta)
+# frozenset para búsqueda O(1) en lugar de recorrer una lista por fila
+_VALORES_VERDADEROS = frozenset({'true', '1', 'sí', 'si', 'yes', 'verdadero'})
 
-def crear_plantilla_fallback(modelo_tipo: str = "tasa"):
-    """Crea una plantilla básica según el tipo de modelo"""
+def _coercionar_dummy_serie(serie: pd.Series) -> pd.Series:
+    """Convierte una columna completa de valores de celda (bool, número o
+    texto) a booleanos dummy de forma vectorizada"""
+    return (
+        serie.map(lambda v: isinstance(v, (bool, int, float)) and pd.notna(v) and bool(v))
+        | serie.astype(str).str.lower().isin(_VALORES_VERDADEROS)
+    )
+
+def _coercionar_columnas_lote(df: pd.DataFrame) -> None:
+    """Coerciona columnas completas del lote una sola vez, en lugar de aplicar
+    float()/int()/bool() fila a fila. Los dtypes anulables de pandas conservan
+    los valores faltantes para que la validación por fila los siga detectando"""
+    if 'superficie' in df.columns:
+        df['superficie'] = pd.to_numeric(df['superficie'], errors='coerce')
+
+    for col in ['dormitorios', 'banos', 'planta']:
+        if col in df.columns:
+            # trunc reproduce el int() del camino por fila original: un 2.5
+            # en la celda se trunca a 2 en lugar de abortar el lote entero
+            # con un cast inseguro float64 -> Int64
+            df[col] = np.trunc(pd.to_numeric(df[col], errors='coerce')).astype('Int64')
+
+    for col in ['ascensor', 'calefaccion', 'calidad_alta', 'vivienda_nueva']:
+        if col in df.columns:
+            nulos = df[col].isna()
+            df[col] = _coercionar_dummy_serie(df[col]).astype('boolean').mask(nulos)
+
+@st.cache_data(show_spinner=False)
+def _plantilla_fallback_bytes() -> bytes:
+    """Serializa la plantilla de ejemplo una sola vez: los datos de muestra
+    son constantes, así que los reruns reutilizan los bytes cacheados en
+    lugar de reconstruir el DataFrame y reescribir el Excel"""
     # Datos de ejemplo para tasa/prima
     sample_data = {
         'codigo_municipio': ['2005', '2006', '2007'],
@@ -986,16 +1069,20 @@ def crear_plantilla_fallback(modelo_tipo: str = "tasa"):
         'creci': [True, False, True],
         'renta': [True, True, False]
     }
-    
+
     df_fallback = pd.DataFrame(sample_data)
-    
+
     # Crear Excel en memoria
     output = io.BytesIO()
     with pd.ExcelWriter(output, engine='openpyxl') as writer:
         df_fallback.to_excel(writer, index=False, sheet_name='Plantilla')
-    
-    excel_data = output.getvalue()
-    
+
+    return output.getvalue()
+
+def crear_plantilla_fallback(modelo_tipo: str = "tasa"):
+    """Crea una plantilla básica según el tipo de modelo"""
+    excel_data = _plantilla_fallback_bytes()
+
     nombre_archivo = f"plantilla_{modelo_tipo}_basica.xlsx"
     
     st.download_button(
@@ -1006,11 +1093,57 @@ def crear_plantilla_fallback(modelo_tipo: str = "tasa"):
         width='stretch'
     )
     
+# Columnas que determinan el resultado del modelo para una fila del lote;
+# filas con los mismos valores producen exactamente el mismo resultado
+_COLUMNAS_CLAVE_LOTE = (
+    'codigo_municipio', 'superficie', 'dormitorios', 'banos', 'planta',
+    'ascensor', 'calefaccion', 'calidad_alta', 'vivienda_nueva', 'creci', 'renta'
+)
+
+# Columnas obligatorias del lote (creci/renta son opcionales) que alimentan
+# las máscaras vectorizadas de validación
+_COLUMNAS_REQUERIDAS_LOTE = (
+    'codigo_municipio', 'superficie', 'dormitorios', 'banos', 'planta',
+    'ascensor', 'calefaccion', 'calidad_alta', 'vivienda_nueva'
+)
+
+# Ubicaciones candidatas de la plantilla Excel (local y contenedor Docker)
+_POSIBLES_RUTAS_PLANTILLA = (
+    "assets/plantilla_tasacion_basica.xlsx",
+    "/app/assets/plantilla_tasacion_basica.xlsx",
+    "./assets/plantilla_tasacion_basica.xlsx",
+    "plantilla_tasacion_basica.xlsx",
+)
+
+@functools.lru_cache(maxsize=1)
+def _resolver_plantilla() -> Optional[bytes]:
+    """Localiza y lee la plantilla Excel una sola vez; evita repetir los
+    os.path.exists y la lectura de disco en cada rerun de Streamlit"""
+    for ruta in _POSIBLES_RUTAS_PLANTILLA:
+        try:
+            if os.path.exists(ruta):
+                with open(ruta, "rb") as f:
+                    return f.read()
+        except Exception as e:
+            print(f"❌ Error cargando plantilla {ruta}: {e}")
+            continue
+    return None
+
+@st.cache_data(show_spinner=False)
+def _exportar_excel_resultados(df_descarga: pd.DataFrame) -> bytes:
+    """Serializa el Excel de resultados; cacheado para que los reruns del
+    bloque de resultados no repitan la escritura openpyxl (Streamlit hashea
+    el DataFrame para la clave de caché)"""
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        df_descarga.to_excel(writer, index=False, sheet_name='Resultados')
+    return output.getvalue()
+
 def pagina_tasacion_multiple():
     """Pestaña para cálculo múltiple por lotes - SOLO TASA Y PRIMA"""
     st.header("Cálculo múltiple por lotes")
     
-    limite_registros = f"{st.session_state.config_sistema['metricas'].get('limite_registros', 50000)}"
+    limite_registros = f"{cargar_configuracion_sistema()['metricas'].get('limite_registros', 50000)}"
 
     with st.expander("ℹ️ Información sobre cálculo múltiple", expanded=False):
         st.markdown(f"""
@@ -1057,8 +1190,17 @@ def pagina_tasacion_multiple():
         
         if uploaded_file is not None:
             try:
-                df = pd.read_excel(uploaded_file)
-                
+                # El motor calamine (Rust) parsea .xlsx varias veces más rápido
+                # que openpyxl; si no está instalado o el archivo es un .xls
+                # antiguo, se recurre al motor por defecto. La normalización de
+                # tipos la hace después _coercionar_columnas_lote en una pasada,
+                # así que no hace falta fijar dtypes en la lectura.
+                try:
+                    df = pd.read_excel(uploaded_file, engine='calamine')
+                except (ImportError, ValueError):
+                    uploaded_file.seek(0)
+                    df = pd.read_excel(uploaded_file)
+
                 print(f"✅ Archivo cargado correctamente - {len(df)} registros detectados")
                 
                 # Estadísticas
@@ -1073,30 +1215,96 @@ def pagina_tasacion_multiple():
                 # Procesar lote
                 if st.button("🚀 Procesar Lote Completo", type="primary", width='stretch'):
                     with st.spinner(f"Procesando {len(df)} registros..."):
+                        # Vectorizar las variables dummy de texto (creci, renta) una sola
+                        # vez para todo el lote en lugar de coercionar fila a fila
+                        for col_dummy in ['creci', 'renta']:
+                            if col_dummy in df.columns:
+                                df[col_dummy] = _coercionar_dummy_serie(df[col_dummy])
+
+                        # Coercionar el resto de columnas del lote de una pasada
+                        _coercionar_columnas_lote(df)
+
                         resultados_exitosos = []
                         resultados_detallados = []
                         errores_detallados = []
-                        
-                        for idx, fila in df.iterrows():
-                            numero_fila = idx + 2  # +2 porque Excel empieza en 1 y tiene headers
-                            
-                            # Validar fila primero
-                            es_valida, errores_validacion = validar_fila_para_modelo(fila, modelo_lote)
-                            
-                            if not es_valida:
-                                errores_detallados.append({
-                                    'fila': numero_fila,
-                                    'estado': '❌ ERROR',
-                                    'codigo_municipio': str(fila.get('codigo_municipio', 'N/A')),
-                                    'error': f"Errores validación: {', '.join(errores_validacion)}"
-                                })
-                                continue
-                            
-                            # Procesar fila individual
-                            es_exitosa, resultado, mensaje_error = procesar_fila_multiple(
-                                fila, st.session_state.modelo, modelo_lote
-                            )
-                            
+
+                        # Barra de progreso actualizada por bloques: refrescar en cada
+                        # fila genera tráfico websocket que domina sobre el cálculo
+                        progreso = st.progress(0)
+                        total_filas = len(df)
+                        cache_filas = {}
+
+                        # 1) Validación vectorizada: una máscara de NA por columna
+                        #    requerida en una sola pasada (la coerción previa deja
+                        #    los valores no numéricos como NA, así que la máscara
+                        #    también los captura); el reporte granular solo se
+                        #    formatea para las filas que fallan
+                        columnas_ausentes = [c for c in _COLUMNAS_REQUERIDAS_LOTE if c not in df.columns]
+                        presentes = [c for c in _COLUMNAS_REQUERIDAS_LOTE if c in df.columns]
+                        errores_fijos = [f"Falta columna requerida: {c}" for c in columnas_ausentes]
+
+                        if presentes:
+                            na_matriz = df[presentes].isna().to_numpy()
+                        else:
+                            na_matriz = np.zeros((total_filas, 0), dtype=bool)
+                        fila_invalida = na_matriz.any(axis=1) | bool(errores_fijos)
+
+                        codigos_lote = df['codigo_municipio'].to_numpy() if 'codigo_municipio' in df.columns else None
+                        for idx in np.flatnonzero(fila_invalida):
+                            numero_fila = int(idx) + 2  # +2 porque Excel empieza en 1 y tiene headers
+                            errores_validacion = errores_fijos + [
+                                f"Valor faltante en columna: {columna}"
+                                for columna, es_na in zip(presentes, na_matriz[idx]) if es_na
+                            ]
+                            errores_detallados.append({
+                                'fila': numero_fila,
+                                'estado': '❌ ERROR',
+                                'codigo_municipio': str(codigos_lote[idx]) if codigos_lote is not None else 'N/A',
+                                'error': f"Errores validación: {', '.join(errores_validacion)}"
+                            })
+
+                        indices_validos = np.flatnonzero(~fila_invalida).tolist()
+                        progreso.progress(0.5)
+
+                        # 2) Puntuación vectorizada: una única pasada matricial sobre
+                        #    las filas únicas (las duplicadas reutilizan el resultado)
+                        df_validas = df.iloc[indices_validos]
+                        columnas_clave = [c for c in _COLUMNAS_CLAVE_LOTE if c in df_validas.columns]
+                        df_unicas = df_validas.drop_duplicates(subset=columnas_clave)
+
+                        valores, contribuciones, mensajes = obtener_modelo_tasacion().calcular_batch(
+                            df_unicas, modelo_lote
+                        )
+
+                        modelo_obj = obtener_modelo_tasacion().obtener_modelo(modelo_lote)
+                        nombre_modelo_legible = modelo_obj['nombre_modelo'] if modelo_obj else modelo_lote
+                        tipo_resultado = 'tasa' if modelo_lote == 'testigos_tasa' else 'prima'
+
+                        for i, fila in enumerate(df_unicas.to_dict('records')):
+                            clave_fila = tuple(fila.get(col) for col in _COLUMNAS_CLAVE_LOTE)
+                            if mensajes[i]:
+                                cache_filas[clave_fila] = (False, {}, mensajes[i])
+                            else:
+                                cache_filas[clave_fila] = (True, {
+                                    'tipo': tipo_resultado,
+                                    'valor': float(valores[i]),
+                                    'contribuciones': contribuciones[i],
+                                    # Desglose ordenado calculado UNA vez por fila única;
+                                    # la tabla y la descarga reutilizan este mismo dict
+                                    'detalles': obtener_detalles_contribuciones(contribuciones[i]),
+                                    'modelo': nombre_modelo_legible,
+                                    'codigo_municipio': str(fila['codigo_municipio']),
+                                    'superficie': fila['superficie']
+                                }, "")
+
+                        progreso.progress(0.7)
+
+                        # 3) Difundir el resultado calculado a cada fila original
+                        for idx, fila in zip(indices_validos, df_validas.to_dict('records')):
+                            numero_fila = idx + 2
+                            clave_fila = tuple(fila.get(col) for col in _COLUMNAS_CLAVE_LOTE)
+                            es_exitosa, resultado, mensaje_error = cache_filas[clave_fila]
+
                             if es_exitosa:
                                 resultados_exitosos.append(resultado)
                                 resultados_detallados.append({
@@ -1106,7 +1314,7 @@ def pagina_tasacion_multiple():
                                     'codigo_municipio': resultado['codigo_municipio'],
                                     'superficie': resultado['superficie'],
                                     'resultado': format_resultado_multiple(resultado),
-                                    'detalles': obtener_detalles_contribuciones(resultado)
+                                    'detalles': resultado['detalles']
                                 })
                             else:
                                 errores_detallados.append({
@@ -1116,6 +1324,8 @@ def pagina_tasacion_multiple():
                                     'error': mensaje_error
                                 })
                         
+                        progreso.progress(1.0)
+
                         # MOSTRAR RESULTADOS DEL PROCESAMIENTO
                         st.subheader("📊 Resultados del Procesamiento")
                         
@@ -1133,36 +1343,36 @@ def pagina_tasacion_multiple():
                         
                         with tab_resultados:
                             if resultados_detallados:
-                                df_resultados = pd.DataFrame(resultados_detallados)
-                                st.dataframe(df_resultados, width='stretch')
+                                # Dtypes respaldados por Arrow: Streamlit convierte a Arrow
+                                # para mostrar, así se evita el cast objeto-a-objeto por celda
+                                df_resultados = pd.DataFrame(resultados_detallados).convert_dtypes(dtype_backend='pyarrow')
+                                # Mostrar solo las primeras filas: enviar el lote completo
+                                # al frontend ralentiza la interfaz en lotes grandes
+                                st.dataframe(df_resultados.head(100), width='stretch', hide_index=True)
+                                if len(df_resultados) > 100:
+                                    st.caption(f"Mostrando 100 de {len(df_resultados)} filas — descargue el Excel para ver todo")
                                 
                                 # BOTÓN DE DESCARGA EN RESULTADOS
                                 if resultados_exitosos:
-                                    # Crear DataFrame para descarga
-                                    datos_descarga = []
-                                    for resultado in resultados_exitosos:
-                                        fila_descarga = {
-                                            'fila': resultados_detallados[resultados_exitosos.index(resultado)]['fila'],
-                                            'modelo': resultado['modelo'],
-                                            'codigo_municipio': resultado['codigo_municipio'],
-                                            'superficie': resultado['superficie'],
-                                            'resultado': resultado['valor']
-                                        }
-                                        
-                                        # Agregar factores más influyentes
-                                        todas_contribuciones = obtener_detalles_contribuciones(resultado['contribuciones'])
-                                        fila_descarga.update(todas_contribuciones)
-                                        
-                                        datos_descarga.append(fila_descarga)
-                                    
-                                    df_descarga = pd.DataFrame(datos_descarga)
-                                    
-                                    # Descargar como Excel
-                                    output = io.BytesIO()
-                                    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                                        df_descarga.to_excel(writer, index=False, sheet_name='Resultados')
+                                    # Construcción por columnas en lugar de un dict por fila:
+                                    # ambas listas de éxito se rellenan en paralelo, así que la
+                                    # posición i se corresponde directamente (sin .index() O(n) por fila)
+                                    datos_descarga = pd.DataFrame({
+                                        'fila': [det['fila'] for det in resultados_detallados],
+                                        'modelo': [res['modelo'] for res in resultados_exitosos],
+                                        'codigo_municipio': [res['codigo_municipio'] for res in resultados_exitosos],
+                                        'superficie': [res['superficie'] for res in resultados_exitosos],
+                                        'resultado': np.asarray([res['valor'] for res in resultados_exitosos])
+                                    })
+
+                                    # Factores más influyentes (columnas de ancho variable),
+                                    # reutilizando el desglose ya calculado por fila única
+                                    factores = pd.DataFrame([res['detalles'] for res in resultados_exitosos])
+
+                                    df_descarga = pd.concat([datos_descarga, factores], axis=1).convert_dtypes(dtype_backend='pyarrow')
                                     
-                                    excel_data = output.getvalue()
+                                    # Descargar como Excel (serialización cacheada por lote)
+                                    excel_data = _exportar_excel_resultados(df_descarga)
                                     st.download_button(
                                         "📊 Descargar Excel con Resultados",
                                         data=excel_data,
@@ -1175,8 +1385,10 @@ def pagina_tasacion_multiple():
                         
                         with tab_errores:
                             if errores_detallados:
-                                df_errores = pd.DataFrame(errores_detallados)
-                                st.dataframe(df_errores, width='stretch')
+                                df_errores = pd.DataFrame(errores_detallados).convert_dtypes(dtype_backend='pyarrow')
+                                st.dataframe(df_errores.head(100), width='stretch', hide_index=True)
+                                if len(df_errores) > 100:
+                                    st.caption(f"Mostrando 100 de {len(df_errores)} filas con error")
                                 
                                 # COMENTAR Mostrar análisis de errores
                                 # st.subheader("📈 Análisis de Errores")
@@ -1190,58 +1402,36 @@ def pagina_tasacion_multiple():
     
     with col2:
         st.subheader("📋 Plantilla de ejemplo")
-        
-        # Cargar plantilla existente desde assets
-        plantilla_path = "assets/plantilla_tasacion_basica.xlsx"
-        
-        # Buscar la plantilla en diferentes ubicaciones posibles
-        posibles_rutas = [
-            plantilla_path,
-            f"/app/{plantilla_path}",
-            f"/app/assets/plantilla_tasacion_basica.xlsx",
-            "./assets/plantilla_tasacion_basica.xlsx",
-            "plantilla_tasacion_basica.xlsx"
-        ]
-        
-        plantilla_encontrada = None
-        for ruta in posibles_rutas:
-            if os.path.exists(ruta):
-                plantilla_encontrada = ruta
-                break
-        
-        if plantilla_encontrada:
-            try:
-                # Leer el archivo Excel existente
-                with open(plantilla_encontrada, "rb") as file:
-                    excel_data = file.read()
-                
-                # Botón para descargar plantilla
-                tipo_modelo = "tasa" if modelo_lote == 'testigos_tasa' else "prima"
-                st.download_button(
-                    f"📥 Descargar plantilla para {tipo_modelo}",
-                    data=excel_data,
-                    file_name=f"plantilla_{tipo_modelo}_basica.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    help=f"Descargue la plantilla para cálculo de {tipo_modelo}",
-                    width='stretch'
-                )
-                
-            except Exception as e:
-                st.error(f"❌ Error cargando plantilla: {e}")
-                # Fallback: crear plantilla básica
-                st.warning("Usando plantilla básica de respaldo...")
-                crear_plantilla_fallback(modelo_lote.split('_')[-1])  # 'tasa' o 'prima'
+
+        # Plantilla resuelta y leída una sola vez (cacheada a nivel de módulo)
+        excel_data = _resolver_plantilla()
+
+        if excel_data is not None:
+            # Botón para descargar plantilla
+            tipo_modelo = "tasa" if modelo_lote == 'testigos_tasa' else "prima"
+            st.download_button(
+                f"📥 Descargar plantilla para {tipo_modelo}",
+                data=excel_data,
+                file_name=f"plantilla_{tipo_modelo}_basica.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                help=f"Descargue la plantilla para cálculo de {tipo_modelo}",
+                width='stretch'
+            )
         else:
             st.error("❌ No se encontró la plantilla en assets/")
             st.info("Creando plantilla de respaldo...")
-            crear_plantilla_fallback(modelo_lote.split('_')[-1])
+            crear_plantilla_fallback(modelo_lote.split('_')[-1])  # 'tasa' o 'prima'
 
         st.markdown("---")
         st.markdown("### 💡 Consejos para el formato")
-        st.write("• **Formato Excel**: Use .xlsx para mejor compatibilidad")
-        st.write("• **Booleanos**: Use VERDADERO/FALSO, True/False, Sí/No, o 1/0")
-        st.write("• **Variables dummy**: Use 1/0, True/False, o Sí/No para creci y renta (solo para modelo Tasa)")
-        st.write("• **Codificación**: UTF-8 para caracteres especiales")
+        # Un único st.markdown en lugar de un st.write por viñeta: cada
+        # llamada envía su propio mensaje delta al navegador
+        st.markdown(
+            "- **Formato Excel**: Use .xlsx para mejor compatibilidad\n"
+            "- **Booleanos**: Use VERDADERO/FALSO, True/False, Sí/No, o 1/0\n"
+            "- **Variables dummy**: Use 1/0, True/False, o Sí/No para creci y renta (solo para modelo Tasa)\n"
+            "- **Codificación**: UTF-8 para caracteres especiales"
+        )
 
 # Funciones auxiliares para el procesamiento múltiple
 def format_resultado_multiple(resultado: Dict) -> str:
@@ -1252,101 +1442,59 @@ def format_resultado_multiple(resultado: Dict) -> str:
         return f"{resultado['valor']:.2%}"
     return "N/A"
 
-def obtener_detalles_contribuciones(contribuciones: Dict) -> str:
+def obtener_detalles_contribuciones(contribuciones: Dict) -> Dict:
     """Obtiene todas las contribuciones como columnas separadas"""
     factores_dict = {}
-    
+
     if contribuciones:
+        factores = list(contribuciones.keys())
+
         # Convertir los valores de porcentaje a números flotantes para ordenar
-        contribs_numericas = []
-        for factor, impacto in contribuciones.items():
+        valores = np.empty(len(factores))
+        for i, impacto in enumerate(contribuciones.values()):
             try:
                 # Remover el símbolo % y convertir a float
                 if isinstance(impacto, str):
-                    valor_numerico = float(impacto.replace('%', '').replace('+', ''))
+                    valores[i] = float(impacto.replace('%', '').replace('+', ''))
                 else:
-                    valor_numerico = float(impacto)
-                contribs_numericas.append((factor, valor_numerico, impacto))
+                    valores[i] = float(impacto)
             except (ValueError, TypeError):
                 # Si no se puede convertir, usar 0
-                contribs_numericas.append((factor, 0.0, impacto))
-        
-        # Ordenar por impacto absoluto (de mayor a menor)
-        contribs_ordenadas = sorted(contribs_numericas, 
-                                  key=lambda x: abs(x[1]), reverse=True)
-        
+                valores[i] = 0.0
+
+        # Ordenar por impacto absoluto (de mayor a menor); argsort de NumPy
+        # en lugar de sorted con lambda (aquí hace falta el orden completo,
+        # no solo el top-K, así que argpartition no aplica)
+        orden = np.argsort(-np.abs(valores))
+
         # Agregar TODAS las contribuciones
-        for i, (factor, valor_numerico, impacto_str) in enumerate(contribs_ordenadas, 1):
+        for i, j in enumerate(orden, 1):
             # Limpiar nombre del factor
-            nombre_limpio = factor.replace('contrib_', '').replace('_', ' ').title()
+            nombre_limpio = factores[j].replace('contrib_', '').replace('_', ' ').title()
             # Reemplazar nombres específicos para mejor legibilidad
             nombre_limpio = nombre_limpio.replace('Tasa Base', 'Componente Base')
             nombre_limpio = nombre_limpio.replace('Prima Base', 'Componente Base')
             nombre_limpio = nombre_limpio.replace('Municipio', 'Efecto Municipio')
-            
+
             factores_dict[f'factor_{i}'] = nombre_limpio
-            factores_dict[f'impacto_{i}'] = f"{valor_numerico:+.1f}%"
-    
+            factores_dict[f'impacto_{i}'] = f"{valores[j]:+.1f}%"
+
     return factores_dict
 
-def pagina_documentacion():
-    """Pestaña de documentación técnica """
-    if not st.session_state.config_sistema:
-        st.error("No se pudo cargar la configuración del sistema")
-        return
-        
-    config = st.session_state.config_sistema
-    doc_config = config.get('documentacion', {})
-    
-    st.header("Documentación técnica")
-    
-    # Introducción desde YAML 
-    introduccion = doc_config.get('introduccion', 'Sistema para cálculo de Tasa de Descuento y Prima de Riesgo basado en análisis de regresión múltiple.')
-    st.markdown(f"""
-    <div style='background: #f0f2f6; padding: 2rem; border-radius: 10px; border-left: 4px solid #1f77b4;'>
-        <h4 style='color: #1f77b4; margin-top: 0;'>Modelos Econométricos para Tasa y Prima</h4>
-        <p style='margin-bottom: 0;'>{introduccion}</p>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    # Metodología desde YAML
-    st.subheader("🔬 Metodología científica")
-    
-    col_metodo1, col_metodo2 = st.columns(2)
-    
-    with col_metodo1:
-        st.markdown("**Bases de datos:**")
-        for item in doc_config.get('metodologia', {}).get('base_datos', []):
-            st.write(f"- {item}")
-        
-        st.markdown("**Procesamiento:**")
-        for item in doc_config.get('metodologia', {}).get('procesamiento', []):
-            st.write(f"- {item}")
-    
-    with col_metodo2:
-        st.markdown("**Validación estadística:**")
-        for item in doc_config.get('metodologia', {}).get('validacion', []):
-            st.write(f"- {item}")
-        
-        st.markdown("**Software utilizado:**")
-        for item in doc_config.get('metodologia', {}).get('software', []):
-            st.write(f"- {item}")
-    
-    # Modelos matemáticos - SOLO TASA Y PRIMA
-    st.subheader("🧮 Modelos matemáticos implementados")
-    
-    tab_model1, tab_model2 = st.tabs(["Tasa Descuento", "Prima Riesgo"])
-        
-    with tab_model1:
-        st.markdown("""
+# Etiquetas de pestañas de la documentación, construidas una sola vez al importar
+_DOC_TABS = ("Tasa Descuento", "Prima Riesgo")
+
+# Contenidos estáticos de la documentación como constantes de módulo:
+# se asignan una vez al importar, sin reconstrucción por rerun
+_TASA_MD = """
         ### Modelo de Tasa de Descuento
-        
+
         $$Tasa_i = \\beta_0 + \\sum_{j=1}^{J}\\beta_j X_{ji} + \\epsilon_i$$
-        
+
         **Componentes:**
         - Tasa libre de riesgo (bonos estado 5 años)
         - Prima de riesgo específica del inmueble
-        
+
         **Variables significativas:**
         - **SU**: Superficie construida
         - **Dnueva**: Vivienda nueva (< 5 años) - dummy
@@ -1358,24 +1506,23 @@ def pagina_documentacion():
         - **creci**: Variable dummy - 1 si la evolución del entorno es creciente, 0 en caso contrario
         - **renta**: Variable dummy - 1 si el nivel de renta del entorno es media o alta, 0 en caso contrario
         - **_cons**: Término constante (tasa base)
-        """)
-        
-        st.latex(r"""
+        """
+
+_TASA_LATEX = r"""
         \text{Tasa Descuento} = \text{Tasa Libre Riesgo} + \text{Prima Riesgo}
-        """)
+        """
 
-    with tab_model2:
-        st.markdown("""
+_PRIMA_MD = """
         ### Modelo de Prima de Riesgo
-        
+
         $$Prima_i = \\beta_0 + \\sum_{j=1}^{J}\\beta_j X_{ji} + \\epsilon_i$$
-        
+
         **Factores de riesgo considerados:**
         - Riesgo de ubicación (municipio)
         - Riesgo por antigüedad y estado
         - Riesgo por características constructivas
         - Riesgo de mercado local
-        
+
         **Variables significativas:**
         - **SU**: Superficie construida
         - **Dnueva**: Vivienda nueva (< 5 años) - dummy
@@ -1385,12 +1532,81 @@ def pagina_documentacion():
         - **DAS**: Ascensor - dummy
         - **CC_Alta**: Calidad constructiva alta - dummy
         - **_cons**: Término constante (prima base)
-        
+
         **Hallazgos clave:**
         - Municipios pequeños: mayor prima por iliquidez
         - Ascensor y calidad constructiva: reducen prima
         - Calefacción: efecto en la prima
-        """)
+        """
+
+@st.cache_data
+def _doc_tasa_markdown() -> str:
+    """Contenido estático de la pestaña Tasa Descuento; cacheado para que
+    los reruns no reconstruyan ni reenvíen la cadena"""
+    return _TASA_MD
+
+@st.cache_data
+def _doc_prima_markdown() -> str:
+    """Contenido estático de la pestaña Prima Riesgo; cacheado igual que el de Tasa"""
+    return _PRIMA_MD
+
+@st.fragment
+def pagina_documentacion():
+    """Pestaña de documentación técnica """
+    config = cargar_configuracion_sistema()
+    if not config:
+        st.error("No se pudo cargar la configuración del sistema")
+        return
+    doc_config = config.get('documentacion', _EMPTY_D)
+    
+    st.header("Documentación técnica")
+    
+    # Introducción desde YAML 
+    introduccion = doc_config.get('introduccion', 'Sistema para cálculo de Tasa de Descuento y Prima de Riesgo basado en análisis de regresión múltiple.')
+    st.markdown(f"""
+    <div style='background: #f0f2f6; padding: 2rem; border-radius: 10px; border-left: 4px solid #1f77b4;'>
+        <h4 style='color: #1f77b4; margin-top: 0;'>Modelos Econométricos para Tasa y Prima</h4>
+        <p style='margin-bottom: 0;'>{introduccion}</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Metodología desde YAML
+    st.subheader("🔬 Metodología científica")
+    
+    col_metodo1, col_metodo2 = st.columns(2)
+
+    # Enlazar el subdict una sola vez en lugar de repetir la cadena de .get()
+    # (que además reconstruye un dict vacío por llamada)
+    metodologia = doc_config.get('metodologia') or {}
+
+    # Una sola llamada st.markdown por lista: un st.write por elemento envía
+    # un mensaje delta al frontend por cada viñeta
+    with col_metodo1:
+        st.markdown("**Bases de datos:**")
+        st.markdown("\n".join(f"- {item}" for item in metodologia.get('base_datos', ())))
+
+        st.markdown("**Procesamiento:**")
+        st.markdown("\n".join(f"- {item}" for item in metodologia.get('procesamiento', ())))
+
+    with col_metodo2:
+        st.markdown("**Validación estadística:**")
+        st.markdown("\n".join(f"- {item}" for item in metodologia.get('validacion', ())))
+
+        st.markdown("**Software utilizado:**")
+        st.markdown("\n".join(f"- {item}" for item in metodologia.get('software', ())))
+    
+    # Modelos matemáticos - SOLO TASA Y PRIMA
+    st.subheader("🧮 Modelos matemáticos implementados")
+    
+    tab_model1, tab_model2 = st.tabs(_DOC_TABS)
+
+    with tab_model1:
+        st.markdown(_doc_tasa_markdown())
+
+        st.latex(_TASA_LATEX)
+
+    with tab_model2:
+        st.markdown(_doc_prima_markdown())
 
     # st.subheader("🏙️ Segmentación por Tamaño Municipal")
     
@@ -1399,11 +1615,13 @@ def pagina_documentacion():
     # # Obtener modelos disponibles desde la configuración
     # modelos_config = config.get('modelos_disponibles', [])
     
-    # # Buscar los R² específicos para cada modelo de valor
-    # r2_menos_10000 = next((modelo.get('r2', '76.32%') for modelo in modelos_config if modelo.get('clave') == 'testigos_menos_10000'), '76.32%')
-    # r2_10000_50000 = next((modelo.get('r2', '73.89%') for modelo in modelos_config if modelo.get('clave') == 'testigos_10000_50000'), '73.89%')
-    # r2_50000_200000 = next((modelo.get('r2', '67.18%') for modelo in modelos_config if modelo.get('clave') == 'testigos_50000_200000'), '67.18%')
-    # r2_mas_200000 = next((modelo.get('r2', '61.95%') for modelo in modelos_config if modelo.get('clave') == 'testigos_mas_200000'), '61.95%')
+    # # Buscar los R² específicos para cada modelo de valor: un único índice
+    # # por clave en lugar de un escaneo lineal next(...) por métrica
+    # r2_por_clave = {m.get('clave'): m.get('r2') for m in modelos_config}
+    # r2_menos_10000 = r2_por_clave.get('testigos_menos_10000') or '76.32%'
+    # r2_10000_50000 = r2_por_clave.get('testigos_10000_50000') or '73.89%'
+    # r2_50000_200000 = r2_por_clave.get('testigos_50000_200000') or '67.18%'
+    # r2_mas_200000 = r2_por_clave.get('testigos_mas_200000') or '61.95%'
 
     # with col_seg1:
     #     st.metric("< 10,000 hab", f"R² = {r2_menos_10000}", "Mayor poder explicativo")
@@ -1423,60 +1641,107 @@ def pagina_documentacion():
     # - **Planta (PLbis)**: Efecto positivo que se intensifica con el tamaño municipal
     # ''')
 
-def mostrar_footer():
-    """Footer usando configuración YAML"""
-    import datetime
-    current_year = datetime.datetime.now().year
-
-    if not st.session_state.config_sistema:
-        sistema_info = {'nombre': 'AESVAL - CTIC', 'version': 'v1.0'}
-    else:
-        sistema_info = st.session_state.config_sistema.get('sistema', {})
-    
-    st.markdown("---")
-    
-    col1, col2, col3 = st.columns([1, 2, 1])
-    
-    with col2:
-        st.markdown(
-            f"""
+# Valores por defecto del bloque 'sistema' del YAML para el footer; un merge
+# único sustituye a cinco sistema_info.get(clave, defecto) por rerun
+_SISTEMA_DEFAULTS = {
+    'año': None,  # None → se sustituye por current_year
+    'desarrollador': 'AESVAL - CTIC',
+    'nombre': 'Sistema de Cálculo de Tasa y Prima',
+    'version': 'v21.0',
+}
+
+# Config mínima cuando no se pudo cargar ningún YAML; permite fusionar el
+# if/else del footer en una única expresión sin ramas
+_CONFIG_FALLBACK = {'sistema': {'nombre': 'AESVAL - CTIC', 'version': 'v1.0'}}
+
+@st.cache_data
+def _footer_html(anyo, desarrollador, nombre, version) -> str:
+    """Construye el HTML del footer una sola vez por combinación de valores;
+    provienen del YAML inmutable, así que los reruns calientes omiten el formateo"""
+    return f"""
             <div style='text-align: center; color: #666; padding:0;'>
                 <p style='margin-bottom: 0; font-size: 0.9rem;'>
-                    © {sistema_info.get('año', current_year)} <strong>{sistema_info.get('desarrollador', 'AESVAL - CTIC')}</strong> | 
-                    {sistema_info.get('nombre', 'Sistema de Cálculo de Tasa y Prima')} {sistema_info.get('version', 'v21.0')}
+                    © {anyo} <strong>{desarrollador}</strong> |
+                    {nombre} {version}
                 </p>
                 <p style='margin-bottom: 0; font-size: 0.8rem;'>
-                    Desarrollado con Streamlit • Modelos Econométricos STATA • 
-                    <a href='https://www.boe.es/buscar/pdf/2003/BOE-A-2003-7253-consolidado.pdf' style='color: blue; text-decoration: underline;' target='_blank'>Normativa ECO/805</a> • 
+                    Desarrollado con Streamlit • Modelos Econométricos STATA •
+                    <a href='https://www.boe.es/buscar/pdf/2003/BOE-A-2003-7253-consolidado.pdf' style='color: blue; text-decoration: underline;' target='_blank'>Normativa ECO/805</a> •
                 </p>
             </div>
-            """, 
-            unsafe_allow_html=True
-        )
+            """
+
+def _compilar_footer(sistema_info: Dict):
+    """Genera una función de footer con el HTML final ya resuelto y capturado
+    en la clausura: los reruns posteriores no hacen lookups ni ramas"""
+    info = {**_SISTEMA_DEFAULTS, **sistema_info}
+    html = _footer_html(
+        info['año'] or current_year,
+        info['desarrollador'],
+        info['nombre'],
+        info['version']
+    )
+    # Sin st.columns: el div ya centra con text-align, y así se evitan tres
+    # contenedores de layout por rerun
+    return lambda: st.markdown(html, unsafe_allow_html=True)
+
+@st.fragment
+def mostrar_footer():
+    """Footer usando configuración YAML.
+
+    Usa el current_year calculado a nivel de módulo: re-importar datetime y
+    llamar a now() en cada rerun es trabajo repetido (el año no cambia
+    durante una sesión)"""
+    footer_fn = st.session_state.get('_footer_fn')
+    if footer_fn is None:
+        sistema_info = (cargar_configuracion_sistema() or _CONFIG_FALLBACK).get('sistema', _EMPTY_D)
+        footer_fn = st.session_state['_footer_fn'] = _compilar_footer(sistema_info)
+
+    st.markdown("---")
+    footer_fn()
+
+# Mapa de navegación construido una sola vez al importar, en lugar de
+# re-crear el dict y las etiquetas en cada rerun de main()
+_PAGINAS = {
+    "📚 Documentación técnica": pagina_documentacion,
+    "🏠 Cálculo individual": pagina_tasacion_individual,
+    "📁 Cálculo por lotes": pagina_tasacion_multiple,
+}
+_PAGINAS_LABELS = tuple(_PAGINAS.keys())
 
 def main():
     """Función principal"""
-    inicializar_session_state()
-    
-    mostrar_header()
-    mostrar_sidebar()
-    
-    tab1, tab2, tab3 = st.tabs([
-        "📚 Documentación técnica", 
-        "🏠 Cálculo individual", 
-        "📁 Cálculo por lotes"
-    ])
-    
-    with tab1:
-        pagina_documentacion()
-    
-    with tab2:
-        pagina_tasacion_individual()
-    
-    with tab3:
-        pagina_tasacion_multiple()
-    
-    mostrar_footer()
+    # Suspender el GC automático durante el rerun: cada rerun crea muchos
+    # widgets de vida corta y las pasadas intermedias del GC añaden latencia;
+    # una única colección de la generación joven al final es suficiente
+    gc.disable()
+    try:
+        inicializar_session_state()
+
+        mostrar_header()
+        mostrar_sidebar()
+
+        # st.tabs ejecutaría los tres cuerpos en cada rerun aunque solo uno sea
+        # visible; con un selector persistido en session_state solo se ejecuta
+        # la página activa (1/3 del trabajo Python por rerun).
+        # Nota: los manejadores que devuelven st.tabs/st.radio son
+        # DeltaGenerators ligados al run actual y no pueden cachearse en
+        # session_state entre reruns; el layout estático restante (header,
+        # footer, markdown de documentación) ya se sirve desde cachés
+        seleccion = st.radio(
+            "Navegación",
+            options=_PAGINAS_LABELS,
+            horizontal=True,
+            label_visibility="collapsed",
+            key="active_tab"
+        )
+
+        _PAGINAS[seleccion]()
+
+        mostrar_footer()
+    finally:
+        gc.collect(0)
+        gc.enable()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
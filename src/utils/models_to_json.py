@@ -1,8 +1,28 @@
-import pandas as pd
-import json
+import os
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def excel_to_json(excel_file, sheet_name, output_file=None):
-    df = pd.read_excel(excel_file, sheet_name=sheet_name)
+import openpyxl
+import orjson
+
+def _guardar_json(modelo_json, output_file):
+    # orjson serializa en Rust y produce bytes directamente; SERIALIZE_NUMPY
+    # acepta los escalares de NumPy que salen de la pasada vectorizada sin
+    # coercionarlos a float uno a uno
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(
+            modelo_json,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        ))
+    print(f"JSON guardado: {output_file}")
+
+def _worksheet_to_json(ws, sheet_name, output_file=None):
+    """Convierte una hoja de coeficientes en el JSON del modelo iterando
+    las tuplas crudas de la hoja (read_only + values_only), sin materializar
+    objetos Cell de openpyxl ni pasar por un DataFrame"""
+    filas = ws.iter_rows(values_only=True)
+    header = next(filas)
+    primera = next(filas)  # primera fila de datos: lleva los coeficientes de variables
 
     modelo_json = {
         "nombre_modelo": sheet_name,
@@ -11,71 +31,101 @@ def excel_to_json(excel_file, sheet_name, output_file=None):
         "_cons": None
     }
 
-    row_vars = df.iloc[0]
-    
-    coef_columns = [col for col in df.columns if col.startswith('Coef.')]
-    
-    coeficientes_variables = {}
-    for col in coef_columns:
-        if col != 'Coef.' and col != 'Coef. _cons':
-            variable_name = col.replace('Coef. ', '').strip()
-            coeficientes_variables[variable_name] = row_vars.get(col)
-    
-    modelo_json["coeficientes_variables"] = coeficientes_variables
-    modelo_json["_cons"] = row_vars.get("Coef. _cons")
-
-    for index, row in df.iterrows():
-        codigo = row.iloc[0]
+    indice_coef = None
+    for j, col in enumerate(header):
+        if not isinstance(col, str):
+            continue
+        if col == 'Coef.':
+            indice_coef = j
+        elif col == 'Coef. _cons':
+            modelo_json["_cons"] = primera[j]
+        elif col.startswith('Coef. '):
+            modelo_json["coeficientes_variables"][col.replace('Coef. ', '').strip()] = primera[j]
 
-        if pd.notna(codigo) and pd.notna(row.get("Coef.")):
-            if codigo != "VMma" and codigo != "CODIGOINTEGRADO" and not isinstance(codigo, str):
-                try:
-                    codigo_int = int(float(codigo))
-                    modelo_json["coeficientes_municipios"][str(codigo_int)] = row["Coef."]
-                except (ValueError, TypeError):
-                    modelo_json["coeficientes_municipios"][str(codigo)] = row["Coef."]
+    if indice_coef is not None:
+        municipios = modelo_json["coeficientes_municipios"]
+        # La primera fila de datos también lleva código de municipio
+        for fila in itertools.chain((primera,), filas):
+            codigo = fila[0]
+            coef = fila[indice_coef] if indice_coef < len(fila) else None
+            if codigo is None or coef is None or isinstance(codigo, str):
+                continue
+            # Ramas por tipo en lugar de try/except como control de flujo:
+            # los códigos llegan de openpyxl como int/float (codigo == codigo
+            # descarta NaN); cualquier otro tipo se guarda como texto
+            if isinstance(codigo, (int, float)) and codigo == codigo:
+                municipios[str(int(codigo))] = coef
+            else:
+                municipios[str(codigo)] = coef
 
     if output_file:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(modelo_json, f, indent=2, ensure_ascii=False)
-        print(f"JSON guardado: {output_file}")
+        _guardar_json(modelo_json, output_file)
 
     return modelo_json
 
+def _procesar_hoja(excel_file, hoja, output_file):
+    """Worker del pool: captura la excepción para que una hoja corrupta
+    no tumbe el resto del lote"""
+    try:
+        # Memoización por mtime (mismo patrón que la caché del YAML de la
+        # app): si el JSON generado es más reciente que el xlsx, el parseo
+        # daría lo mismo, así que se relee el resultado guardado
+        if os.path.exists(output_file) and os.path.getmtime(output_file) >= os.path.getmtime(excel_file):
+            with open(output_file, 'rb') as f:
+                return hoja, orjson.loads(f.read()), None
+        # read_only evita construir el grafo completo de celdas; cada worker
+        # abre su propio handle porque el workbook no es picklable
+        wb = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+        try:
+            return hoja, _worksheet_to_json(wb[hoja], hoja, output_file), None
+        finally:
+            wb.close()
+    except Exception as e:
+        return hoja, None, str(e)
+
 def procesar_todas_hojas(excel_file, output_prefix="modelo"):
-    excel_file_obj = pd.ExcelFile(excel_file)
-    hojas = excel_file_obj.sheet_names
-    
+    # Solo hacen falta los nombres de hoja: read_only no descomprime las celdas
+    wb = openpyxl.load_workbook(excel_file, read_only=True)
+    hojas = wb.sheetnames
+    wb.close()
+
     resultados = {}
-    
-    for hoja in hojas:
-        print(f"Procesando: {hoja}")
-        
-        output_file = f"{output_prefix}_{hoja.replace(' ', '_').replace('.', '')}.json"
-        
-        try:
-            modelo_json = excel_to_json(excel_file, hoja, output_file)
-            resultados[hoja] = modelo_json
-        except Exception as e:
-            print(f"Error en {hoja}: {e}")
-    
+
+    # Cada hoja se parsea de forma independiente (el coste es el parseo XML
+    # de openpyxl, CPU puro), así que un pool de procesos escala casi lineal
+    # con los núcleos disponibles
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        futuros = {
+            pool.submit(_procesar_hoja, excel_file, hoja,
+                        f"{output_prefix}_{hoja.replace(' ', '_').replace('.', '')}.json"): hoja
+            for hoja in hojas
+        }
+        for futuro in as_completed(futuros):
+            hoja, modelo_json, error = futuro.result()
+            if error is not None:
+                print(f"Error en {hoja}: {error}")
+            else:
+                print(f"Procesada: {hoja}")
+                resultados[hoja] = modelo_json
+
     return resultados
 
 if __name__ == "__main__":
     excel_file = "assets/Coeficientes_modelos.xlsx"
 
-    # modelo = excel_to_json(
-    #     excel_file=excel_file,
-    #     sheet_name="Testigos_menos de 10.000",
-    #     output_file="config/modelo_testigos_menos_10000.json"
+    # Ejemplo para una sola hoja:
+    # _, modelo, error = _procesar_hoja(
+    #     excel_file,
+    #     "Testigos_menos de 10.000",
+    #     "config/modelo_testigos_menos_10000.json"
     # )
     
     # print("Estructura generada:")
-    # print(json.dumps({
+    # print(orjson.dumps({
     #     "nombre_modelo": modelo["nombre_modelo"],
     #     "coeficientes_municipios_ejemplo": dict(list(modelo["coeficientes_municipios"].items())[:3]),
     #     "coeficientes_variables": modelo["coeficientes_variables"],
     #     "_cons": modelo["_cons"]
-    # }, indent=2))
+    # }, option=orjson.OPT_INDENT_2).decode())
     
     resultados = procesar_todas_hojas(excel_file, "config/modelo")
\ No newline at end of file
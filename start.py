@@ -3,6 +3,7 @@
 Script de inicio multiplataforma para AESVAL Tasación App
 """
 
+import compileall
 import os
 import sys
 import platform
@@ -40,7 +41,12 @@ def main():
     # Forzar el flush de la salida
     sys.stdout.flush()
     time.sleep(1) # Pequeña pausa para asegurarse de que se muestren los mensajes
-    
+
+    # Precompilar el bytecode de la app antes de lanzar Streamlit: el proceso
+    # hijo hereda los __pycache__ ya escritos y el primer arranque no paga la
+    # compilación en frío de src/
+    compileall.compile_dir('src', quiet=1)
+
     # Ejecutar Streamlit como subprocess para mantener el control
     subprocess.run([
         "streamlit", "run", "src/app.py",